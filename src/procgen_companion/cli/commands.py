@@ -1,5 +1,10 @@
+import io
 import os
 import sys
+import queue
+import shutil
+import threading
+import concurrent.futures
 from typing import Optional, Union, List, Iterator
 from pathlib import Path
 
@@ -9,6 +14,7 @@ import csv
 
 import procgen_companion.core as pg
 import procgen_companion.tags as tags
+import procgen_companion.util as util
 import procgen_companion.errors as errors
 import procgen_companion.cli.args as c
 
@@ -55,16 +61,14 @@ def _generate_or_sample(args: Union[c.Generate, c.Sample]):
 
     # Copy the template to the output directory
     if args.copy_template:
-        yaml.dump(
-            template,
-            open(output_dir / "template.yaml", "w"),
-            default_flow_style=False,
-            Dumper=yaml.SafeDumper,
-        )
+        copy_template(args.path, template, output_dir)
 
     # Create iterator over variations
     if isinstance(args, c.Sample):
         amount = args.amount  # TODO: If more than n_variations, warn
+        if args.workers > 1:
+            sample_parallel(args.path, args.seed, args.amount, args.workers, output_dir)
+            return
         iterator = pg.generate("sample", template, args.amount)
     else:
         head = args.head if args.head is not None else n_variations
@@ -97,7 +101,12 @@ def sample_bulk(args: c.SampleBulk):
     output_dir_base = args.output or Path(f"./variations_{args.path.stem}/")
     output_dir_base.mkdir(parents=True, exist_ok=True)
 
-    log = open(output_dir_base / "log.csv", "w")
+    log = open(output_dir_base / "log.csv", "w", newline="")
+    log_writer = csv.writer(log)
+
+    # Parsed templates are cached by mtime, so re-runs over a mostly
+    # unchanged directory skip the YAML parsing.
+    template_cache_dir = output_dir_base / ".template_cache"
 
     for template_path in iterdir(
         args.path,
@@ -117,29 +126,31 @@ def sample_bulk(args: c.SampleBulk):
         pb_prefix = f"{tpath_f} (?)".ljust(48 + 8 + len(" ()"))
 
         try:
-            template = pg.read(template_path)
+            template = pg.read_cached(template_path, template_cache_dir)
 
             # Copy the template to the output directory
             if args.copy_template:
-                yaml.dump(
-                    template,
-                    open(output_dir / "template.yaml", "w"),
-                    default_flow_style=False,
-                    Dumper=yaml.SafeDumper,
-                )
+                copy_template(template_path, template, output_dir)
 
             # Add extra info to the progress bar prefix
-            nvars = pg.count_recursive(pg.read(template_path))
+            nvars = pg.count_recursive(
+                pg.read_cached(template_path, template_cache_dir)
+            )
             nvars_f = truncate_middle(str(nvars), width=8, placeholder="...")
             pb_prefix = f"{tpath_f} ({nvars_f})".ljust(48 + 8 + len(" ()"))
 
             # Actually generate the variations
-            iterator = pg.generate("sample", template, args.amount)
-            consume_variations(
-                iterator, args.amount, output_dir, "", pb_prefix=pb_prefix
-            )
+            if args.workers > 1:
+                sample_parallel(
+                    template_path, args.seed, args.amount, args.workers, output_dir
+                )
+            else:
+                iterator = pg.generate("sample", template, args.amount)
+                consume_variations(
+                    iterator, args.amount, output_dir, "", pb_prefix=pb_prefix
+                )
 
-            csv.writer(log).writerow(
+            log_writer.writerow(
                 [
                     template_path,
                     f"Success. Sampled {args.amount} from {nvars} possible variations.",
@@ -154,31 +165,170 @@ def sample_bulk(args: c.SampleBulk):
             # Continue for "expected errors"
             if isinstance(e, errors.ProcGenError):
                 print(f"{pb_prefix}: Error ({e.user_label})")
-                csv.writer(log).writerow([template_path, f"Error ({e.user_label})"])
+                log_writer.writerow([template_path, f"Error ({e.user_label})"])
 
             # Break for unexpected errors
             else:
                 print(f"Unexpected error while processing {template_path}:")
-                csv.writer(log).writerow([template_path, "Unexpected error"])
+                log_writer.writerow([template_path, "Unexpected error"])
                 # raise e
 
     log.close()
 
 
+def copy_template(template_path: Path, template: tags.ArenaConfig, output_dir: Path):
+    """
+    Put a copy of the template in the output directory. The proc_meta block
+    must not end up in the copy; when the source file doesn't have one we can
+    byte-copy the file and skip a full-template YAML emit.
+    """
+    if b"proc_meta" not in template_path.read_bytes():
+        shutil.copyfile(template_path, output_dir / "template.yaml")
+        return
+
+    yaml.dump(
+        template,
+        open(output_dir / "template.yaml", "w"),
+        default_flow_style=False,
+        Dumper=util.SafeDumper,
+    )
+
+
+def sample_parallel(
+    path: Path, seed: int, amount: int, workers: int, output_dir: Path
+):
+    """
+    Sample variations with a pool of worker processes. Each worker parses the
+    template once and then samples, finishes, dumps, and writes variations
+    independently; only the (filename, labels) rows for meta.csv come back.
+
+    Each variation is sampled from its own seed derived from (seed, i),
+    so results are deterministic regardless of worker count.
+    """
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_sample_worker,
+        initargs=(path, seed, output_dir),
+    ) as executor:
+        chunksize = max(1, min(64, amount // (workers * 4) or 1))
+        results = executor.map(_sample_one, range(amount), chunksize=chunksize)
+
+        meta_file = open(output_dir / "meta.csv", "w", newline="")
+        meta_writer = csv.writer(meta_file)
+        try:
+            for filename, labels in tqdm.tqdm(results, total=amount):
+                meta_writer.writerow([filename] + labels)
+        finally:
+            # A worker's exception surfaces mid-iteration; closing (and so
+            # flushing) here keeps meta.csv covering the results consumed
+            # before the failure, mirroring the serial path.
+            meta_file.close()
+
+
+# Per-process state for sampling workers, set once by _init_sample_worker.
+_sample_worker: dict = {}
+
+
+def _init_sample_worker(path: Path, seed: int, output_dir: Path):
+    pg.init(seed)
+    template = pg.read(path)
+    _sample_worker["template"] = template
+    _sample_worker["template_meta"] = (
+        template.get_proc_meta() or tags.TemplateMeta.default()
+    )
+    template.del_proc_meta()
+    _sample_worker["seed"] = seed
+    _sample_worker["out_prefix"] = str(output_dir) + os.sep
+    _sample_worker["make_filename"] = filename_formatter("")
+
+
+def _sample_one(i: int):
+    util.RNG.seed(pg.variation_seed(_sample_worker["seed"], i))
+    variation, meta = pg.sample_recursive(_sample_worker["template"])
+    pg.finish_variation(variation, meta, _sample_worker["template_meta"])
+
+    filename = _sample_worker["make_filename"](i, meta.labels)
+    document = yaml.dump(
+        variation,
+        default_flow_style=False,
+        Dumper=util.CachingDumper,
+        encoding="utf-8",
+    )
+    with open(_sample_worker["out_prefix"] + filename, "wb") as f:
+        f.write(document)
+    return filename, meta.labels
+
+
 def consume_variations(
     iterator, amount, output_dir, prefix, pb_prefix: Optional[str] = None
 ):
-    # Consume iterator over variations
-    meta_file = open(output_dir / "meta.csv", "w")
-    for i, (variation, meta) in tqdm.tqdm(
-        enumerate(iterator), total=amount, desc=pb_prefix
-    ):
-        filename = format_filename(prefix, i, meta.labels)
-        csv.writer(meta_file).writerow([filename] + meta.labels)
-        with open(output_dir / filename, "w") as f:
-            yaml.dump(variation, f, default_flow_style=False, Dumper=yaml.SafeDumper)
+    # Drive the variation iterator on a producer thread, so building the next
+    # variation (CPU) overlaps with dumping and writing the previous one (I/O).
+    # The bounded queue keeps at most a few variations in memory at once.
+    variations: queue.Queue = queue.Queue(maxsize=32)
+    end_of_iterator = object()
 
-    meta_file.close()
+    def produce():
+        try:
+            for item in iterator:
+                variations.put(item)
+            variations.put(end_of_iterator)
+        except BaseException as e:
+            variations.put(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    # Consume the queue of variations
+    make_filename = filename_formatter(prefix)
+    meta_file = open(output_dir / "meta.csv", "w", newline="")
+    meta_writer = csv.writer(meta_file)
+    # Buffer meta rows and write them out in batches, so the per-variation
+    # loop does one list append instead of a csv encode + file write.
+    meta_rows: list[list] = []
+    buffer = io.BytesIO()
+    # Plain string concat per file; Path.__truediv__ would re-parse the
+    # (fixed) directory part for every variation.
+    out_prefix = str(output_dir) + os.sep
+    try:
+        with tqdm.tqdm(total=amount, desc=pb_prefix) as progress_bar:
+            i = 0
+            while True:
+                item = variations.get()
+                if item is end_of_iterator:
+                    break
+                if isinstance(item, BaseException):
+                    raise item  # Re-raise errors from the producer thread.
+
+                variation, meta = item
+                filename = make_filename(i, meta.labels)
+                meta_rows.append([filename] + meta.labels)
+                if len(meta_rows) >= 1000:
+                    meta_writer.writerows(meta_rows)
+                    meta_rows.clear()
+                # Emit into a reused bytes buffer and write each file with one
+                # syscall, instead of the many small writes the emitter does on
+                # its own (plus the text-mode encoding layer).
+                buffer.seek(0)
+                buffer.truncate()
+                yaml.dump(
+                    variation,
+                    buffer,
+                    default_flow_style=False,
+                    Dumper=util.CachingDumper,
+                    encoding="utf-8",
+                )
+                with open(out_prefix + filename, "wb") as f:
+                    f.write(buffer.getvalue())
+                i += 1
+                progress_bar.update(1)
+        producer.join()
+    finally:
+        # Also on the error path: a failing template is a supported case
+        # (sample_bulk logs it and moves on), and meta.csv must still cover
+        # the variation files that were already written.
+        meta_writer.writerows(meta_rows)
+        meta_file.close()
 
 
 def iterdir(
@@ -209,10 +359,22 @@ def iterdir(
                 yield template_path
 
 
-def format_filename(prefix: str, variation_idx: int, labels: list[str]):
-    label = f"_{'_'.join(labels)}" if labels else ""
+def filename_formatter(prefix: str):
+    """
+    Build a filename formatter with the constant parts (prefix, extension)
+    resolved once, instead of re-evaluating them per variation.
+    """
     prefix = f"{prefix}_" if prefix else ""
-    return f"{prefix}{variation_idx:05d}{label}.yaml"
+
+    def format_filename(variation_idx: int, labels: list[str]) -> str:
+        stem = "%s%05d" % (prefix, variation_idx)
+        if labels:
+            # One join over all parts, instead of joining the labels and
+            # then concatenating the result onto the stem.
+            stem = "_".join((stem, *labels))
+        return stem + ".yaml"
+
+    return format_filename
 
 
 def truncate_middle(s: str, width: int, placeholder="..."):
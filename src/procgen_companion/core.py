@@ -1,4 +1,5 @@
-import random
+import hashlib
+import pickle
 from typing import Any, Callable, Iterator, Literal, Tuple
 from pathlib import Path
 
@@ -10,29 +11,80 @@ import procgen_companion.util as util
 from procgen_companion.meta import Meta
 
 
-def init(seed: int):
-    # Add constructors and representers for the custom YAML tags
-    for tag in (
-        tags.GET_ANIMAL_AI_TAGS() + tags.GET_PROC_GEN_TAGS() + tags.GET_SPECIAL_TAGS()
-    ):
-        tag_name: str = f"!{tag.tag}"  # type: ignore
-        yaml.SafeLoader.add_constructor(tag_name, tag.construct)
-        yaml.SafeDumper.add_representer(tag, tag.represent)  # type: ignore
+# Registration mutates PyYAML's global loader/dumper classes, so it only
+# needs to (and only should) happen once per process, even when init is
+# called repeatedly (e.g. from tests or library use).
+_YAML_REGISTERED = False
 
-    # Add custom representer for MutablePlaceholder
-    yaml.SafeDumper.add_representer(
-        util.MutablePlaceholder, util.MutablePlaceholder.represent
-    )
+# Base seed from init, used to derive per-variation seeds in generate.
+_SEED = 0
 
-    # Add custom list representer for collapsing lists of scalars
-    yaml.SafeDumper.add_representer(list, util.custom_list_representer)
 
-    # Set Python random seed for hopefully deterministic generation
-    random.seed(seed)
+def init(seed: int):
+    global _YAML_REGISTERED, _SEED
+    _SEED = seed
+
+    if not _YAML_REGISTERED:
+        # The C-accelerated loader/dumper classes do not share registries
+        # with the pure-Python ones, so register on both: the aliases cover
+        # the hot paths, the plain yaml classes cover the cold ones.
+        loaders = {yaml.SafeLoader, util.SafeLoader}
+        dumpers = {yaml.SafeDumper, util.SafeDumper}
+
+        # Add constructors and representers for the custom YAML tags
+        for tag in (
+            tags.GET_ANIMAL_AI_TAGS()
+            + tags.GET_PROC_GEN_TAGS()
+            + tags.GET_SPECIAL_TAGS()
+        ):
+            tag_name: str = f"!{tag.tag}"  # type: ignore
+            for loader in loaders:
+                loader.add_constructor(tag_name, tag.construct)
+            for dumper in dumpers:
+                dumper.add_representer(tag, tag.represent)  # type: ignore
+
+        for dumper in dumpers:
+            # Add custom representer for MutablePlaceholder
+            dumper.add_representer(
+                util.MutablePlaceholder, util.MutablePlaceholder.represent
+            )
+            # Add custom list representer for collapsing lists of scalars
+            dumper.add_representer(list, util.custom_list_representer)
+
+        _YAML_REGISTERED = True
+
+    # Seed the dedicated RNG instance for hopefully deterministic generation
+    util.RNG.seed(seed)
 
 
 def read(path: Path) -> tags.ArenaConfig:
-    return yaml.load(path.read_text(), Loader=yaml.SafeLoader)
+    return yaml.load(path.read_text(), Loader=util.SafeLoader)
+
+
+def read_cached(path: Path, cache_dir: Path) -> tags.ArenaConfig:
+    """
+    Like read, but memoized on the template's mtime via a pickle sidecar in
+    cache_dir. Re-runs over a mostly-unchanged template directory skip the
+    YAML parse for unchanged files and do a (much faster) pickle load instead.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.md5(str(path.resolve()).encode()).hexdigest()
+    cache_path = cache_dir / f"{digest}.pkl"
+    mtime_ns = path.stat().st_mtime_ns
+
+    if cache_path.exists():
+        try:
+            with open(cache_path, "rb") as f:
+                cached_mtime_ns, template = pickle.load(f)
+            if cached_mtime_ns == mtime_ns:
+                return template
+        except Exception:
+            pass  # Stale or corrupt cache; fall through to a fresh parse.
+
+    template = read(path)
+    with open(cache_path, "wb") as f:
+        pickle.dump((mtime_ns, template), f, protocol=pickle.HIGHEST_PROTOCOL)
+    return template
 
 
 def generate(
@@ -60,8 +112,27 @@ def generate(
     template_meta = template.get_proc_meta() or tags.TemplateMeta.default()
     template.del_proc_meta()  # We don't want to save this in the output
 
+    # Register the template's maximal static subtrees (no ProcGen tags
+    # anywhere below them) with the caching dumper. Their YAML representation
+    # is identical in every variation, so whenever variations share such a
+    # subtree by identity it is only represented once across all dumps.
+    util.CachingDumper.clear_static()
+    _static_ids.clear()
+    for subtree in static_subtrees(template):
+        util.CachingDumper.mark_static(subtree)
+        _static_ids.add(id(subtree))
+
     if mode == "sample":
-        variations = (sample_recursive(template) for _ in range(amount))
+        # Reseed per variation, so variation i only depends on (seed, i) and
+        # not on how much randomness earlier variations consumed. This makes
+        # serial output identical to the parallel workers', which sample the
+        # same seeds spread over multiple processes.
+        def sample_all():
+            for i in range(amount):
+                util.RNG.seed(variation_seed(_SEED, i))
+                yield sample_recursive(template)
+
+        variations = sample_all()
     elif mode == "exhaustive":
         full_iterator = iterate_variations_recursive(template)
         variations = (next(full_iterator) for _ in range(amount))
@@ -70,82 +141,175 @@ def generate(
 
     # Generate all requested variations
     for variation, meta in variations:
-        # We need a second pass to fix !ProcIf's and !ProcIfLabels, since they
-        # need to access the final variations.
-        # We can't use yaml.dump's implicit pass, as id's are already removed from tags then.
+        finish_variation(variation, meta, template_meta)
+        yield variation, meta
 
-        # Fill in !ProcIf's MutablePlaceholders
-        def fill_placeholder(node: Any) -> Any:
-            if not isinstance(node, util.MutablePlaceholder):
-                return True  # Continue walk.
 
-            if node.is_filled():
-                # This can occur when a !ProcIf refers to another !ProcIf
-                # which causes the dependencies to already be filled.
-                _value, label = node.value, node.label
-            else:
-                _value, label = node.fill(variation)
+def finish_variation(variation: Any, meta: Meta, template_meta: tags.TemplateMeta):
+    """
+    Second pass over a generated variation: fill in !ProcIf's
+    MutablePlaceholders and resolve !ProcIfLabels. This needs to happen after
+    generation, since both need access to the final variation.
+    We can't use yaml.dump's implicit pass, as id's are already removed from
+    tags then.
+    """
 
-            meta.add_label(label)
-            return False  # Stop walking this branch.
+    # The placeholders were collected onto the Meta as they were created, so
+    # this is O(#placeholders) instead of a walk over the whole variation.
+    for placeholder in meta.placeholders:
+        if placeholder.is_filled():
+            # This can occur when a !ProcIf refers to another !ProcIf
+            # which causes the dependencies to already be filled.
+            label = placeholder.label
+        else:
+            _value, label = placeholder.fill(variation)
 
-        walk_tree(variation, fill_placeholder)
+        meta.add_label(label)
 
-        # Fill in !ProcIfLabels's
-        _ = [
-            handlers.ProcIfLabels.resolve(pil, variation, meta)
-            for pil in template_meta.proc_labels
-        ]
+    _ = [
+        handlers.ProcIfLabels.resolve(pil, variation, meta)
+        for pil in template_meta.proc_labels
+    ]
 
-        yield variation, meta
+
+# Module-local alias: the recursive passes below resolve the dispatch
+# function once instead of doing an attribute lookup per visited node.
+_get_node_handler = handlers.get_node_handler
+
+# ids of the template's static subtrees, filled in by generate. The recursion
+# below returns those subtrees as-is: they have exactly one "variation"
+# (themselves), so recursing into them would rebuild an identical copy of a
+# tree we already have. Sharing them untouched across variations is also what
+# lets the CachingDumper reuse their represented nodes between dumps.
+_static_ids: set[int] = set()
 
 
 def iterate_variations_recursive(node: Any) -> Iterator[Tuple[Any, Meta]]:
-    handler = handlers.get_node_handler(node)
+    if id(node) in _static_ids:
+        return iter(((node, Meta()),))
+    handler = _get_node_handler(node)
     return handler.iterate(node, iterate_variations_recursive)
 
 
+def variation_seed(seed: int, i: int) -> int:
+    """
+    Derive an independent RNG seed for variation `i` from the base seed.
+
+    The multiplier spreads adjacent base seeds far apart, so the streams of
+    seed `s` and seed `s + 1` don't overlap for the first million variations.
+    """
+    return seed * 1_000_003 + i
+
+
 def sample_recursive(node: Any) -> Tuple[Any, Meta]:
-    handler = handlers.get_node_handler(node)
+    if id(node) in _static_ids:
+        return node, Meta()
+    handler = _get_node_handler(node)
     return handler.sample(node, sample_recursive)
 
 
 def count_recursive(node: Any):
-    handler = handlers.get_node_handler(node)
-    return handler.count(node, count_recursive)
+    return _memoized_counter({})(node)
+
+
+def _memoized_counter(cache: dict[int, int]) -> Callable[[Any], int]:
+    """
+    Build a counting recursor that caches results per subtree, keyed by object
+    identity. Nodes are not mutated while counting, so id-keyed memoization is
+    safe; the cache only lives for a single counting pass, never across the
+    generation phase.
+    """
+
+    def count(node: Any) -> int:
+        key = id(node)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+        result = _get_node_handler(node).count(node, count)
+        cache[key] = result
+        return result
+
+    return count
 
 
 def explain_count_recursive(node: Any):
-    exp = _explain_count_recursive(node)
+    # Share one count cache across the whole explanation, so the count that
+    # is reported per ProcGen node doesn't re-walk its subtree each time.
+    exp = _explain_count_recursive(node, _memoized_counter({}))
     if exp == "":
         return "No variations"
     return exp
 
 
-def _explain_count_recursive(node: Any):
+def _explain_count_recursive(node: Any, count: Callable[[Any], int]):
     """
     Generate a string explaining where the number of variations comes from.
     For example output is: 6#ProcList x 5#ProcColor x 4#ProcVector3Scaled,
     which generates 6 * 5 * 4 = 120 variations.
     """
-    handler = handlers.get_node_handler(node)
+    handler = _get_node_handler(node)
     if issubclass(handler, handlers.StaticNodeHandler):
         children = handler.children(node)
-        explanations = [_explain_count_recursive(child) for child in children]
+        explanations = [_explain_count_recursive(child, count) for child in children]
         return " x ".join(explanation for explanation in explanations if explanation)
     elif issubclass(handler, handlers.ProcGenNodeHandler):
         if issubclass(handler, (handlers.ProcIf, handlers.ProcIfLabels)):
             return ""
-        return f"{handler.count(node, count_recursive)}#{node.tag}"
+        return f"{handler.count(node, count)}#{node.tag}"
     else:
         raise TypeError(f"Programmer error. Unknown type {type(handler)} {handler}.")
 
 
+def static_subtrees(node: Any) -> list[Any]:
+    """
+    Collect the maximal subtrees that contain no ProcGen tags, i.e. the parts
+    of the template that come out identical in every variation.
+    """
+    out: list[Any] = []
+    if _collect_static(node, out) and _is_markable(node):
+        out.append(node)
+    return out
+
+
+def _collect_static(node: Any, out: list[Any]) -> bool:
+    """
+    Return whether the subtree at `node` is fully static. Maximal static
+    subtrees found below a non-static node are appended to `out`.
+    """
+    if isinstance(node, tags.ProcGenTag):
+        # Don't look inside ProcGen tags: their contents are option pools,
+        # not shared output structure.
+        return False
+    children = _get_node_handler(node).children(node)
+    child_static = [_collect_static(child, out) for child in children]
+    if all(child_static):
+        return True
+    for child, static in zip(children, child_static):
+        if static and _is_markable(child):
+            out.append(child)
+    return False
+
+
+def _is_markable(node: Any) -> bool:
+    # Only containers and tags are worth caching. Scalars must never be
+    # cached by id: CPython interns small ints and strings, so distinct
+    # occurrences can share an id, and a reused scalar node would make the
+    # dumper emit anchors/aliases for plain values.
+    return isinstance(node, (dict, list, tags.CustomTag))
+
+
 def walk_tree(node: Any, callback: Callable[[Any], bool]):
     """
-    Recursively walk the tree, calling the callback on each node.
+    Walk the tree depth-first, calling the callback on each node.
+
+    Iterative with an explicit stack: one Python frame total instead of one
+    per level, so pathologically deep templates can't hit the recursion limit.
     """
-    continue_ = callback(node)
-    if continue_:
-        handler = handlers.get_node_handler(node)
-        util.consume(walk_tree(child, callback) for child in handler.children(node))
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        continue_ = callback(node)
+        if continue_:
+            handler = _get_node_handler(node)
+            # Reversed, so children are visited in document order.
+            stack.extend(reversed(handler.children(node)))
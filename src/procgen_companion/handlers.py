@@ -16,9 +16,6 @@ from typing import (
 from abc import ABC, abstractmethod
 from copy import deepcopy
 from textwrap import dedent
-import random
-import functools
-import operator
 import math
 
 import procgen_companion.tags as tags
@@ -69,8 +66,7 @@ class NodeHandler(ABC, Generic[NodeType, OutputType]):
 class Util:
     @staticmethod
     def count(children: Iterable[Any], count: Recursor) -> int:
-        child_counts = [count(child) for child in children]
-        return functools.reduce(operator.mul, child_counts, 1)
+        return math.prod(count(child) for child in children)
 
 
 class StaticNodeHandler:
@@ -90,6 +86,7 @@ def extract_meta(children: Sequence[Tuple[Any, Meta]]) -> Meta:
     variation_meta = Meta()
     for meta in children_metas:
         variation_meta.labels.extend(meta.labels)
+        variation_meta.placeholders.extend(meta.placeholders)
     return variation_meta
 
 
@@ -252,8 +249,9 @@ class AnimalAIMapping(
     def sample(
         node: tags.CustomMappingTag, sample: Recursor
     ) -> WithMeta[tags.CustomMappingTag]:
-        keys = list(node.__dict__.keys())
-        children = [sample(child) for child in node.__dict__.values()]
+        fields = node.fields()
+        keys = [k for k in fields if k[0] != "_"]
+        children = [sample(fields[k]) for k in keys]
         return type(node)(**dict(zip(keys, extract_children(children)))), extract_meta(
             children
         )
@@ -267,12 +265,11 @@ class AnimalAIMapping(
         node: tags.CustomMappingTag, iterate: Recursor
     ) -> Iterator[WithMeta[tags.CustomMappingTag]]:
         # We get the keys() early so they definitely align with the values().
-        keys = list(node.__dict__.keys())
+        fields = node.fields()
+        keys = [k for k in fields if k[0] != "_"]
 
         # We need to force early binding of the child here. https://stackoverflow.com/q/7368522/6182278
-        child_iterators = [
-            (lambda c=child: iterate(c)) for child in node.__dict__.values()
-        ]
+        child_iterators = [(lambda c=fields[k]: iterate(c)) for k in keys]
 
         # Each yield of product_generator is a single variant (but only the dict values).
         product_generator = util.product(*child_iterators)
@@ -286,7 +283,18 @@ class AnimalAIMapping(
 
     @staticmethod
     def children(node: tags.CustomMappingTag) -> list[Any]:
-        return list(node.__dict__.values())
+        # children() is called repeatedly for the same node across the
+        # counting, static-marking and generation passes, so cache the list
+        # on the node itself. The underscore prefix keeps the cache entry out
+        # of sample/iterate and out of the representers; del_proc_meta (the
+        # only post-parse field mutation) invalidates it.
+        children = getattr(node, "_children", None)
+        if children is None:
+            children = [v for k, v in node.fields().items() if k[0] != "_"]
+            # setattr, so this works on the dict-backed tags and the slotted
+            # ones (Vector3, RGB) alike without tripping mypy's slots check.
+            setattr(node, "_children", children)
+        return children
 
 
 class AnimalAIScalar(
@@ -331,7 +339,7 @@ class ProcList(NodeHandler[tags.ProcList, Any], ProcGenNodeHandler):
 
     @staticmethod
     def sample(node: tags.ProcList, sample: Recursor) -> WithMeta[Any]:
-        return deepcopy(random.choice(node.options)), Meta()
+        return deepcopy(util.RNG.choice(node.options)), Meta()
 
     @staticmethod
     def count(node: tags.ProcList, count: Recursor) -> int:
@@ -353,7 +361,7 @@ class ProcListLabelled(NodeHandler[tags.ProcListLabelled, Any], ProcGenNodeHandl
 
     @staticmethod
     def sample(node: tags.ProcListLabelled, sample: Recursor) -> WithMeta[Any]:
-        option: tags.LabelledOption = deepcopy(random.choice(node.options))
+        option: tags.LabelledOption = deepcopy(util.RNG.choice(node.options))
         return option["value"], Meta(labels=[option["label"]])
 
     @staticmethod
@@ -381,7 +389,7 @@ class ProcColor(NodeHandler[tags.ProcColor, tags.RGB], ProcGenNodeHandler):
 
     @staticmethod
     def sample(node: tags.ProcColor, sample: Recursor) -> WithMeta[tags.RGB]:
-        return to_rgb(deepcopy(random.choice(util.COLORS))), Meta()
+        return to_rgb(deepcopy(util.RNG.choice(util.COLORS))), Meta()
 
     @staticmethod
     def count(node: tags.ProcColor, count: Recursor) -> int:
@@ -419,7 +427,7 @@ class ProcVector3Scaled(
             if node.base is not None
             else tags.Vector3(x=1, y=1, z=1)
         )
-        scale_idx = random.randint(0, len(node.scales) - 1)
+        scale_idx = util.RNG.randint(0, len(node.scales) - 1)
         scale = node.scales[scale_idx]
 
         if node.labels is None:
@@ -470,7 +478,9 @@ class ProcRepeatChoice(
     @staticmethod
     def sample(node: tags.ProcRepeatChoice, sample: Recursor) -> WithMeta[List[Any]]:
         choice, meta = sample(node.value)
-        return [choice] + [deepcopy(choice) for _ in range(node.amount - 1)], meta
+        copies = [deepcopy(choice) for _ in range(node.amount - 1)]
+        ProcRepeatChoice.__register_copied_placeholders(copies, meta)
+        return [choice] + copies, meta
 
     @staticmethod
     def count(node: tags.ProcRepeatChoice, count: Recursor) -> int:
@@ -480,15 +490,32 @@ class ProcRepeatChoice(
     def iterate(
         node: tags.ProcRepeatChoice, iterate: Recursor
     ) -> Iterator[Tuple[Any, Meta]]:
-        def duplicate(var):
-            return [var] + [deepcopy(var) for _ in range(node.amount - 1)]
+        def duplicate(var, meta):
+            copies = [deepcopy(var) for _ in range(node.amount - 1)]
+            ProcRepeatChoice.__register_copied_placeholders(copies, meta)
+            return [var] + copies
 
-        return ((duplicate(var), meta) for var, meta in iterate(node.value))
+        return ((duplicate(var, meta), meta) for var, meta in iterate(node.value))
 
     @staticmethod
     def children(node: tags.ProcRepeatChoice) -> list[Any]:
         return [node.amount, node.value]
 
+    @staticmethod
+    def __register_copied_placeholders(copies: List[Any], meta: Meta) -> None:
+        # Deepcopying the chosen value also copies any MutablePlaceholders
+        # inside it. Those copies are filled (and labelled) individually, so
+        # they must be collected onto the Meta like the originals were.
+        if not meta.placeholders:
+            return
+        stack = list(copies)
+        while stack:
+            child = stack.pop()
+            if isinstance(child, util.MutablePlaceholder):
+                meta.placeholders.append(child)
+                continue
+            stack.extend(get_node_handler(child).children(child))
+
 
 class ProcRestrictCombinations(
     NodeHandler[tags.ProcRestrictCombinations, Any], ProcGenNodeHandler
@@ -535,9 +562,9 @@ class ProcIf(NodeHandler[tags.ProcIf, util.MutablePlaceholder], ProcGenNodeHandl
         def proc_if(root):
             return ProcIf.__resolve_condition(node, root)
 
-        return util.MutablePlaceholder(
-            proc_if
-        ), Meta()  # Meta gets filled in second pass.
+        placeholder = util.MutablePlaceholder(proc_if)
+        # Labels get filled in the second pass, via Meta.placeholders.
+        return placeholder, Meta(placeholders=[placeholder])
 
     @staticmethod
     def count(node: tags.ProcIf, count: Recursor) -> int:
@@ -553,7 +580,7 @@ class ProcIf(NodeHandler[tags.ProcIf, util.MutablePlaceholder], ProcGenNodeHandl
             return ProcIf.__resolve_condition(node, root)
 
         placeholder = util.MutablePlaceholder(proc_if)
-        return iter([(placeholder, Meta())])
+        return iter([(placeholder, Meta(placeholders=[placeholder]))])
 
     @staticmethod
     def children(node: tags.ProcIf) -> list[Any]:
@@ -562,7 +589,7 @@ class ProcIf(NodeHandler[tags.ProcIf, util.MutablePlaceholder], ProcGenNodeHandl
 
     @staticmethod
     def __resolve_condition(node: tags.ProcIf, root: Any) -> Tuple[Any, Label]:
-        variables = node.value if isinstance(node.value, list) else [node.value]
+        variables = node._variables
         labels: list[Any] = (
             node.labels if node.labels else [cast(str, None)] * len(node.cases)
         )
@@ -628,8 +655,7 @@ class ProcIfLabels(
         assert (
             len(node.labels) == len(node.cases)
         ), f"!ProcIfLabels has a different number of cases ({len(node.cases)}) vs. labels ({len(node.labels)}). They should be equal."
-        variables = node.value if isinstance(node.value, list) else [node.value]
-        idx, values = ConditionResolver.resolve(variables, node.cases, variation)
+        idx, values = ConditionResolver.resolve(node._variables, node.cases, variation)
 
         # No matches
         if idx == -1:
@@ -664,9 +690,18 @@ HANDLERS: List[Type[NodeHandler]] = [
 ]
 
 
+# Which handler applies depends only on the concrete type of the node, so the
+# result of the linear can_handle scan can be cached per type.
+_HANDLER_BY_TYPE: dict[type, Type[NodeHandler]] = {}
+
+
 def get_node_handler(node: Any) -> Type[NodeHandler]:
+    handler = _HANDLER_BY_TYPE.get(type(node))
+    if handler is not None:
+        return handler
     for handler in HANDLERS:
         if handler.can_handle(node):
+            _HANDLER_BY_TYPE[type(node)] = handler
             return handler
     raise ValueError(f"Could not find a node class for {node}")
 
@@ -1,12 +1,25 @@
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from procgen_companion.util import MutablePlaceholder
 
 
 class Meta:
     # List of labels that should be added to the filename
     labels: list[str]
 
-    def __init__(self, labels: Optional[list[str]] = None):
+    # MutablePlaceholders created for this variation's !ProcIf's, collected
+    # at creation time so the second pass can fill them directly instead of
+    # walking the whole variation to find them.
+    placeholders: "list[MutablePlaceholder]"
+
+    def __init__(
+        self,
+        labels: Optional[list[str]] = None,
+        placeholders: Optional["list[MutablePlaceholder]"] = None,
+    ):
         self.labels = labels if labels is not None else []
+        self.placeholders = placeholders if placeholders is not None else []
 
     def add_label(self, label: Optional[str] = None):
         if label is not None:
@@ -1,5 +1,4 @@
 from __future__ import annotations
-from abc import ABC, abstractmethod
 from typing import (
     Any,
     List,
@@ -10,7 +9,7 @@ from typing import (
     TypedDict,
     Dict,
     Self,
-    Iterable,
+    cast,
 )
 
 import yaml
@@ -18,22 +17,41 @@ import yaml
 import procgen_companion.errors as errors
 
 
-class CustomTag(ABC):
+class CustomTag:
+    # A plain class rather than an ABC: the tag classes are only ever
+    # instantiated through construct, so abstractmethod enforcement buys
+    # nothing, while ABCMeta makes every isinstance check (frequent in the
+    # handlers and representers) go through __instancecheck__.
+
+    # Empty slots on the bases (and marker mixins below), so that concrete
+    # tags can opt into __slots__; subclasses that don't declare slots keep
+    # their instance __dict__ as before.
+    __slots__ = ()
+
     tag: str
 
+    # The "!<tag>" string and flow flag passed to the dumper, resolved once
+    # per class instead of being re-formatted for every represented node.
+    _yaml_tag: str = ""
+    _flow: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        tag = getattr(cls, "tag", None)
+        if isinstance(tag, str):
+            cls._yaml_tag = "!" + tag
+        cls._flow = getattr(cls, "flow_style", "block") == "flow"
+
     @classmethod
-    @abstractmethod
     def construct(cls, loader: yaml.Loader, node: Any) -> Any:
-        pass
+        raise NotImplementedError
 
     @classmethod
-    @abstractmethod
     def represent(cls, dumper: yaml.Dumper, data: Self) -> Any:  # type: ignore
-        pass
+        raise NotImplementedError
 
-    @abstractmethod
     def __getitem__(self, item: Any) -> Any:
-        pass
+        raise NotImplementedError
 
 
 def GET_ANIMAL_AI_TAGS() -> List[Type[CustomTag]]:
@@ -70,16 +88,20 @@ class AnimalAITag:
     Simple marker class for AnimalAI tags.
     """
 
+    __slots__ = ()
+
 
 class ProcGenTag:
     """
     Simple marker class for ProcGen tags.
     """
 
-    pass
+    __slots__ = ()
 
 
 class WithId:
+    __slots__ = ()
+
     id: Optional[str]  # Might not be initialised to None
 
     def get_id(self) -> Optional[str]:
@@ -89,70 +111,135 @@ class WithId:
 
 
 class WithTemplateMeta:
+    __slots__ = ()
+
     # This is only used for ArenaConfig, but we do this in a separate class
     # such that proc_meta doesn't show in __dict__.
     proc_meta: Optional[Dict[str, Any]]  # Might not be initialised to None
 
     def get_proc_meta(self) -> Optional[TemplateMeta]:
         if hasattr(self, "proc_meta") and self.proc_meta is not None:
-            return TemplateMeta(**self.proc_meta)
+            # Convert the raw dict once; repeated calls get the same object.
+            cached = self.__dict__.get("_proc_meta")
+            if cached is None:
+                cached = TemplateMeta(**self.proc_meta)
+                self.__dict__["_proc_meta"] = cached
+            return cached
         return None
 
     def del_proc_meta(self) -> None:
         if hasattr(self, "proc_meta"):
             del self.proc_meta
+            self.__dict__.pop("_proc_meta", None)
+            # The handler's cached children list includes proc_meta's value.
+            self.__dict__.pop("_children", None)
 
 
 class CustomMappingTag(CustomTag):
+    __slots__ = ()
+
     # Note: All AnimalAI mapping specify an order of their fields for dumping.
     # This allows us to:
     # - Specify a fixed, sane, order for all the fields (e.g. x,y,z for Vector3)
     # - Filter out meta-fields like 'id' that are not part of the AnimalAI spec.
     order: Optional[list[str]] = None
     flow_style = "block"
+    # Whether construction needs fully materialized (deep) child values.
+    # Tags whose fields are scalars by definition can skip the deep pass.
+    construct_deep: bool = True
+
+    # Resolved once per class by __init_subclass__, so construct/represent
+    # don't re-inspect `order`, `flow_style` and the annotations per node.
+    _repr_keys: Optional[tuple[str, ...]] = None
+    _valid_keys: frozenset = frozenset()
+
+    # Child-values cache, set lazily by handlers.AnimalAIMapping.children.
+    # The underscore keeps it out of represent's unordered dump path.
+    _children: list
+
+    # Class-configuration names that show up in annotations (on the bases
+    # and on the concrete tags, e.g. `tag: str = "Arena"`) but are not
+    # template fields, so they must never validate as mapping keys.
+    _CONFIG_KEYS = frozenset(("tag", "order", "flow_style", "construct_deep"))
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._repr_keys = tuple(cls.order) if cls.order is not None else None
+        # Merge annotations over the whole MRO, so fields annotated on a
+        # mixin (WithId, WithTemplateMeta) or an intermediate base count as
+        # valid keys too, not only the ones re-annotated on the class itself.
+        cls._valid_keys = frozenset(
+            key
+            for klass in cls.__mro__
+            for key in getattr(klass, "__annotations__", {})
+            if not key.startswith("_") and key not in cls._CONFIG_KEYS
+        )
 
     def __init__(self, **kwargs):
         self.__dict__.update(kwargs)
 
+    def fields(self) -> dict[str, Any]:
+        """
+        Name -> value mapping of the fields set on this node. The slotted
+        tags (Vector3, RGB) override this, everything else just exposes its
+        instance __dict__.
+        """
+        return self.__dict__
+
     @classmethod
     def construct(cls, loader: yaml.Loader, node: yaml.nodes.MappingNode) -> Any:
         # Meaning of deep: https://stackoverflow.com/questions/43812020/what-does-deep-true-do-in-pyyaml-loader-construct-mapping
         # Otherwise, the custom tag constructors are called with empty lists and dicts.
-        mapping = loader.construct_mapping(node, deep=True)
-        str_mapping = {str(k): v for k, v in mapping.items()}
-
-        # Validate
-        annotations = cls.__dict__["__annotations__"]
-        for k in str_mapping.keys():
-            if k not in annotations:
-                raise ValueError(f"Unexpected key '{k}' in tag '{cls.tag}'")
-
-        return cls(**str_mapping)
+        mapping = loader.construct_mapping(node, deep=cls.construct_deep)
+
+        # Validate with a single C-level set difference. YAML keys are
+        # practically always valid strings, so the happy path does no key
+        # scan at all; non-string keys surface as "invalid" and get one
+        # stringify-and-revalidate retry before we give up.
+        invalid = mapping.keys() - cls._valid_keys
+        if invalid:
+            mapping = {str(k): v for k, v in mapping.items()}
+            invalid = mapping.keys() - cls._valid_keys
+            if invalid:
+                raise ValueError(
+                    f"Unexpected keys {sorted(invalid, key=str)} in tag '{cls.tag}'"
+                )
+
+        # The validation above guarantees every key is a known (string)
+        # annotation; construct_mapping's own type can't express that.
+        return cls(**cast("dict[str, Any]", mapping))
 
     @classmethod
     def represent(cls, dumper: yaml.Dumper, data: Self) -> Any:  # type: ignore
-        dd = data.__dict__
-        fields = (
-            list(dd.items())
-            if (cls.order is None)
-            # Unordered
-            else [(k, dd[k]) for k in cls.order if k in dd]
-        )  # Ordered
-        fields = [(k, v) for k, v in fields if v is not None]  # Filter out None values
-        return dumper.represent_mapping(
-            f"!{cls.tag}", fields, flow_style=(cls.flow_style == "flow")
-        )
+        if cls._repr_keys is None:
+            # Unordered; filter out None values and private derived fields
+            fields = [
+                (k, v) for k, v in data.fields().items() if v is not None and k[0] != "_"
+            ]
+        else:
+            # Ordered; filter out missing and None values. getattr instead of
+            # __dict__ so this also covers the slotted tags.
+            fields = [
+                (k, v)
+                for k in cls._repr_keys
+                if (v := getattr(data, k, None)) is not None
+            ]
+        return dumper.represent_mapping(cls._yaml_tag, fields, flow_style=cls._flow)
 
     def __getitem__(self, item: Any) -> Any:
-        return self.__dict__[item]
+        try:
+            return getattr(self, item)
+        except AttributeError:
+            raise KeyError(item) from None
 
 
-class CustomSequenceTag(CustomTag, Iterable[Any]):
+class CustomSequenceTag(CustomTag):
+    # Not inheriting typing.Iterable: it drags the ABC machinery back in,
+    # and the subclasses' __iter__ is all that iteration actually needs.
     flow_style = "block"
 
-    @abstractmethod
     def __init__(self, value: Any) -> None:
-        pass
+        raise NotImplementedError
 
     @classmethod
     def construct(cls, loader: yaml.Loader, node: yaml.nodes.SequenceNode) -> Any:
@@ -161,27 +248,21 @@ class CustomSequenceTag(CustomTag, Iterable[Any]):
 
     @classmethod
     def represent(cls, dumper: yaml.Dumper, data: Self) -> Any:  # type: ignore
-        return dumper.represent_sequence(
-            f"!{cls.tag}", data, flow_style=(cls.flow_style == "flow")
-        )
+        return dumper.represent_sequence(cls._yaml_tag, data, flow_style=cls._flow)
 
-    @abstractmethod
     def __setitem__(self, key: int, value: Any) -> None:
-        pass
+        raise NotImplementedError
 
-    @abstractmethod
     def __getitem__(self, item: Any) -> Any:
-        pass
+        raise NotImplementedError
 
-    @abstractmethod
     def __iter__(self) -> Iterator[Any]:
-        pass
+        raise NotImplementedError
 
 
 class CustomScalarTag(CustomTag):
-    @abstractmethod
     def __init__(self, value: Any) -> None:
-        pass
+        raise NotImplementedError
 
     @classmethod
     def construct(cls, loader: yaml.Loader, node: yaml.nodes.ScalarNode) -> Any:
@@ -191,7 +272,7 @@ class CustomScalarTag(CustomTag):
     def represent(cls, dumper: yaml.Dumper, data: Self) -> Any:  # type: ignore
         assert len(data.__dict__) == 1
         value = next(iter(data.__dict__.values()))  # Should only be one value
-        return dumper.represent_scalar(f"!{cls.tag}", str(value))
+        return dumper.represent_scalar(cls._yaml_tag, str(value))
 
     def __getitem__(self, item: Any) -> Any:
         raise ValueError(f"Scalar tag '{self.tag} {self}' does not being indexed.")
@@ -238,12 +319,20 @@ class Vector3(CustomMappingTag, AnimalAITag, WithId):
     tag: str = "Vector3"
     flow_style: str = "flow"
     order = ["x", "y", "z"]
+    construct_deep = False  # x, y, z are always scalars
+    # By far the most numerous tag in expanded templates, so slotted:
+    # no per-instance dict saves roughly half the memory per node.
+    # The extra slots hold the optional id and the handlers' children cache.
+    __slots__ = ("x", "y", "z", "id", "_children")
     id: Optional[str]
 
     x: Any
     y: Any
     z: Any
 
+    def fields(self) -> dict[str, Any]:
+        return {"x": self.x, "y": self.y, "z": self.z}
+
     def __init__(self, x: Any, y: Any, z: Any) -> None:
         self.x = x
         self.y = y
@@ -261,12 +350,27 @@ class RGB(CustomMappingTag, AnimalAITag, WithId):
     tag: str = "RGB"
     flow_style: str = "flow"
     order = ["r", "g", "b"]
+    construct_deep = False  # r, g, b are always scalars
+    __slots__ = ("r", "g", "b", "id", "_children")
     id: Optional[str]
 
     r: Any
     g: Any
     b: Any
 
+    def __init__(self, r: Any, g: Any, b: Any, id: Optional[str] = None) -> None:
+        self.r = r
+        self.g = g
+        self.b = b
+        if id is not None:
+            self.id = id
+
+    def fields(self) -> dict[str, Any]:
+        fields = {"r": self.r, "g": self.g, "b": self.b}
+        if hasattr(self, "id"):
+            fields["id"] = self.id
+        return fields
+
 
 # ------------ ProcGen tags ------------
 
@@ -308,11 +412,13 @@ class ProcListLabelled(CustomSequenceTag, ProcGenTag):
 
 
 def new_labelled_option(option) -> LabelledOption:
-    msg = f"!ProcListLabelled items must be a mapping of (value, label) got {option}"
-    assert isinstance(option, dict), msg
-    assert "label" in option, msg
-    assert "value" in option, msg
-    return LabelledOption(label=option["label"], value=option["value"])
+    # The error message is only formatted on the failure path; the old
+    # asserts built it (including str(option)) for every valid item too.
+    if type(option) is dict and "label" in option and "value" in option:
+        return {"label": option["label"], "value": option["value"]}
+    raise AssertionError(
+        f"!ProcListLabelled items must be a mapping of (value, label) got {option}"
+    )
 
 
 class LabelledOption(TypedDict):
@@ -327,7 +433,7 @@ class ProcColor(CustomScalarTag, ProcGenTag):
 
     def __init__(self, amount: int):
         # TODO: Check when amount is higher than the colors available.
-        self.amount = int(amount)
+        self.amount = amount if type(amount) is int else int(amount)
 
 
 class ProcVector3Scaled(CustomMappingTag, ProcGenTag):
@@ -343,7 +449,12 @@ class ProcVector3Scaled(CustomMappingTag, ProcGenTag):
         base: Optional[Vector3] = None,
         labels: Optional[list[str]] = None,
     ):
-        self.scales = [float(x) for x in scales]
+        # The YAML resolver has usually typed the scales already; only
+        # convert when something (e.g. an int) actually needs it.
+        if all(type(x) is float for x in scales):
+            self.scales = scales
+        else:
+            self.scales = [float(x) for x in scales]
         self.base = base
         self.labels = labels
 
@@ -355,7 +466,7 @@ class ProcRepeatChoice(CustomMappingTag, ProcGenTag):
     value: Any
 
     def __init__(self, amount: int, value: Any):
-        self.amount = int(amount)
+        self.amount = amount if type(amount) is int else int(amount)
         self.value = value
 
 
@@ -366,7 +477,7 @@ class ProcRestrictCombinations(CustomMappingTag, ProcGenTag):
     item: Any  # TODO: Rename to value
 
     def __init__(self, amount: int, item: Any):
-        self.amount = int(amount)
+        self.amount = amount if type(amount) is int else int(amount)
         self.item = item
 
 
@@ -395,6 +506,9 @@ class ProcIf(CustomMappingTag, ProcGenTag):
         self.default = default
         self.labels = labels
         self.default_label = default_label
+        # `value` never changes after parsing, so normalize it to a list of
+        # variables once instead of on every per-variation resolve.
+        self._variables = value if isinstance(value, list) else [value]
 
         if not isinstance(self.cases, list):
             raise errors.NodeAnnotatedProcGenError(
@@ -459,6 +573,7 @@ class ProcIfLabels(CustomMappingTag):
         self.cases = cases
         self.labels = labels
         self.default = default
+        self._variables = value if isinstance(value, list) else [value]
 
         if not isinstance(self.cases, list):
             raise errors.NodeAnnotatedProcGenError(
@@ -547,4 +662,6 @@ class Range(CustomSequenceTag):
             raise IndexError(f"Index {item} out of range for !R (max length 2)")
 
     def __iter__(self) -> Iterator[Any]:
-        return iter([self.min, self.max])
+        # Iterated during YAML emit for every !R in every variation; a
+        # 2-tuple comes from CPython's free list, a fresh list does not.
+        return iter((self.min, self.max))
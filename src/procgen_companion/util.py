@@ -1,12 +1,29 @@
 from __future__ import annotations
-import itertools
-import collections
+import io
+import copy
+import random
 from typing import Any, Optional, Callable
 
 import yaml
 
+# LibYAML's C parser and emitter are typically 5-10x faster than the
+# pure-Python ones. Fall back transparently when PyYAML was built without
+# libyaml.
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper  # type: ignore[assignment]
+    from yaml import SafeLoader  # type: ignore[assignment]
+
 from procgen_companion import tags
 
+# Dedicated RNG instance for generation, seeded in core.init.
+# Using our own instance instead of the module-global `random` state keeps
+# generation re-entrant and safe to parallelize (the global RNG is shared
+# and lock-protected across the whole process).
+RNG = random.Random()
+
 
 def product(*iterables, **kwargs):
     """
@@ -15,21 +32,73 @@ def product(*iterables, **kwargs):
     consumes the full iterable before returning the first element.
     I.e. there are no huge memory requirements.
 
+    Factors may be zero-argument callables returning a fresh iterator; this
+    is how a factor gets restarted each time it wraps around.
+
+    Implemented as an iterative odometer (the rightmost factor cycles
+    fastest) instead of the earlier nested recursive generators, so each
+    yielded row costs one tuple allocation rather than one generator frame
+    and one intermediate tuple per factor.
+
     Examples:
         product('ABCD', 'xy') --> Ax Ay Bx By Cx Cy Dx Dy
 
     References:
-        [source] <https://stackoverflow.com/questions/12093364/cartesian-product-of-large-iterators-itertools>
         [itertools.product] <https://docs.python.org/3/library/itertools.html#itertools.product>
     """
+    iterables = iterables * kwargs.get("repeat", 1)
     if len(iterables) == 0:
         yield ()
-    else:
-        iterables = iterables * kwargs.get("repeat", 1)
-        it = iterables[0]
-        for item in it() if callable(it) else iter(it):
-            for items in product(*iterables[1:]):
-                yield (item,) + items
+        return
+
+    def restart(factor):
+        return factor() if callable(factor) else iter(factor)
+
+    sentinel = object()
+    iterators = [restart(factor) for factor in iterables]
+    current = []
+    for iterator in iterators:
+        item = next(iterator, sentinel)
+        if item is sentinel:
+            return  # One empty factor makes the whole product empty.
+        current.append(item)
+
+    while True:
+        yield tuple(current)
+
+        # Find the rightmost factor that still has a next item.
+        position = len(iterables) - 1
+        while position > 0:
+            item = next(iterators[position], sentinel)
+            if item is not sentinel:
+                current[position] = item
+                break
+            position -= 1
+        if position == 0:
+            # The first factor is consumed lazily, exactly once, and never
+            # restarted; once it runs out the product is done.
+            item = next(iterators[0], sentinel)
+            if item is sentinel:
+                return
+            current[0] = item
+
+        # Restart the factors that wrapped around, left to right. The order
+        # (advance first, then restart) matters: some child iterators draw
+        # from the RNG, so it must match the old recursive implementation
+        # for identical seeds to keep producing identical variations.
+        for wrapped in range(position + 1, len(iterables)):
+            iterators[wrapped] = restart(iterables[wrapped])
+            item = next(iterators[wrapped], sentinel)
+            if item is sentinel:
+                return
+            current[wrapped] = item
+
+
+# Types whose lists get dumped inline (flow style). Checked by exact type:
+# a frozenset probe on type(x) skips the MRO walk isinstance would do, and
+# none of these are subclassed in practice (bool is listed explicitly since
+# it no longer matches as a subclass of int).
+_INLINE_LEAF_TYPES = frozenset((str, int, float, bool, tags.Range))
 
 
 def custom_list_representer(dumper, data):
@@ -37,7 +106,7 @@ def custom_list_representer(dumper, data):
     Custom representer for lists that uses flow style (i.e. short inline style)
     if all items are scalars or !R ranges.
     """
-    if all(isinstance(item, (str, int, float, tags.Range)) for item in data):
+    if all(type(item) in _INLINE_LEAF_TYPES for item in data):
         return dumper.represent_sequence("tag:yaml.org,2002:seq", data, flow_style=True)
     else:
         return dumper.represent_sequence(
@@ -45,35 +114,116 @@ def custom_list_representer(dumper, data):
         )
 
 
-def pprint(node: Any) -> str:
+class CachingDumper(SafeDumper):
     """
-    Pretty print a node.
+    SafeDumper that reuses the represented node graph for subtrees explicitly
+    marked as static (i.e. identical across all dumped variations).
+
+    Representing a static subtree once and splicing the cached nodes into each
+    subsequent document skips re-walking the Python objects on every dump.
+    Only subtrees that are actually shared between variations (by object
+    identity) produce cache hits, so marking is conservative and opt-in.
     """
-    return yaml.dump(
-        node, default_flow_style=False, sort_keys=False, Dumper=yaml.SafeDumper
-    )
 
+    # id(obj) -> obj, to keep marked objects (and thus their ids) alive.
+    _static: dict[int, Any] = {}
+    _node_cache: dict[int, yaml.nodes.Node] = {}
+    # id -> ids of other marked subtrees whose cached nodes were spliced
+    # into this subtree's cached graph (a template anchor shared between a
+    # static parent and a standalone occurrence). Cache hits register these
+    # too, so the standalone occurrence takes the copy branch below.
+    _nested_ids: dict[int, tuple[int, ...]] = {}
 
-def consume(iterator, n=None):
-    """
-    Advance the iterator n-steps ahead. If n is None, consume entirely.
+    # Per-instance stack of in-progress cache builds, created lazily by
+    # represent_data; each entry collects the nested splices of one build.
+    _splice_stack: list[list[int]]
+
+    @classmethod
+    def mark_static(cls, obj: Any) -> None:
+        cls._static[id(obj)] = obj
+
+    @classmethod
+    def clear_static(cls) -> None:
+        cls._static.clear()
+        cls._node_cache.clear()
+        cls._nested_ids.clear()
+
+    def ignore_aliases(self, data: Any) -> bool:
+        # The non-caching generation path rebuilds every subtree, so its dumps
+        # never contain &id/*id alias pairs even when the template anchored a
+        # subtree in several places. Static-subtree sharing reintroduces
+        # object identity between those places; expand every occurrence so
+        # output stays byte-compatible with the non-caching path.
+        return True
+
+    def represent_data(self, data: Any) -> Any:
+        key = id(data)
+        if key not in self._static:
+            return super().represent_data(data)
+        node = self._node_cache.get(key)
+        if node is None:
+            # First dump of this subtree: build and cache its node graph,
+            # collecting the ids of marked subtrees represented inside it.
+            stack = getattr(self, "_splice_stack", None)
+            if stack is None:
+                stack = self._splice_stack = []
+            nested: list[int] = []
+            stack.append(nested)
+            node = super().represent_data(data)
+            stack.pop()
+            self._node_cache[key] = node
+            self._nested_ids[key] = tuple(nested)
+            self._register_splice(key, node)
+            return node
+        if key in self.represented_objects:
+            # The subtree's cached nodes are already spliced into this
+            # document (earlier occurrence, or inside a static parent's
+            # graph); the serializer aliases repeated node objects
+            # regardless of ignore_aliases, so repeats get a fresh copy.
+            # (With aliasing off, represented_objects is otherwise unused
+            # and doubles as the per-document splice registry.)
+            return copy.deepcopy(node)
+        self._register_splice(key, node)
+        return node
 
-    Source:
-        https://docs.python.org/3/library/itertools.html#itertools-recipes
+    def _register_splice(self, key: int, node: yaml.nodes.Node) -> None:
+        # Record that `node` (and the cached graphs nested inside it) now
+        # occurs in the current document, and report the splice to any
+        # enclosing cache build in progress.
+        self.represented_objects[key] = node
+        for nested_key in self._nested_ids.get(key, ()):
+            if nested_key not in self.represented_objects:
+                self._register_splice(nested_key, self._node_cache[nested_key])
+        stack = getattr(self, "_splice_stack", None)
+        if stack:
+            stack[-1].append(key)
+
+
+# Reused by pprint across calls; generation is single-threaded, so one
+# module-level buffer is enough and saves a StringIO per printed node.
+_pprint_buffer = io.StringIO()
+
+
+def pprint(node: Any) -> str:
     """
-    # Use functions that consume iterators at C speed.
-    if n is None:
-        # feed the entire iterator into a zero-length deque
-        collections.deque(iterator, maxlen=0)
-    else:
-        # advance to the empty slice starting at position n
-        next(itertools.islice(iterator, n, n), None)
+    Pretty print a node.
+    """
+    _pprint_buffer.seek(0)
+    _pprint_buffer.truncate()
+    yaml.dump(
+        node,
+        _pprint_buffer,
+        default_flow_style=False,
+        sort_keys=False,
+        Dumper=SafeDumper,
+    )
+    return _pprint_buffer.getvalue()
 
 
 # The first three colors in the list are red, green, and blue, respectively.
 # The next three colors are yellow, magenta, and cyan, which are created by mixing the primary colors.
 # The last four colors are various shades of gray.
-COLORS = [
+COLORS: tuple = (
     (255, 0, 0),
     (0, 255, 0),
     (0, 0, 255),
@@ -84,7 +234,38 @@ COLORS = [
     (128, 128, 128),
     (128, 0, 0),
     (0, 128, 0),
-]
+)
+
+
+class _Unfilled:
+    """
+    Marks a MutablePlaceholder that has not been filled yet. A dedicated
+    sentinel instead of None, so a !ProcIf that legitimately resolves to null
+    still counts as filled.
+
+    Copying must preserve identity: !ProcRepeatChoice deep-copies subtrees
+    that can contain unfilled placeholders, and the `is _UNFILLED` checks
+    have to keep working on the copies.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+        return cls._instance
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_Unfilled, ())
+
+
+_UNFILLED = _Unfilled()
 
 
 class MutablePlaceholder:
@@ -92,31 +273,38 @@ class MutablePlaceholder:
     # Therefore, we replace it during generation with this one, which deals with
     # resolving the conditionals during yaml.dump.
 
+    # One placeholder is created per !ProcIf per variation, so keep them slim.
+    __slots__ = ("proc_if", "value", "label")
+
     proc_if: Callable[[Any], Any]
-    value: Optional[Any]
+    value: Any
     label: Optional[str]
 
     def __init__(self, proc_if: Callable[[Any], Any]):
         self.proc_if = proc_if
-        self.value = None
+        self.value = _UNFILLED
 
     def fill(self, root: Any):
         self.value, self.label = self.proc_if(root)
         return self.value, self.label
 
     def is_filled(self):
-        return self.value is not None
+        return self.value is not _UNFILLED
 
     def __getitem__(self, key):
-        if self.value is None:
+        if self.value is _UNFILLED:
             raise ValueError(
                 "MutablePlaceholder has not been filled yet. Programmer error."
             )
         return self.value[key]
 
     @classmethod
-    def represent(cls, dumper: yaml.SafeDumper, data: MutablePlaceholder) -> Any:
-        if data.value is None:
+    def represent(
+        cls, dumper: yaml.representer.SafeRepresenter, data: MutablePlaceholder
+    ) -> Any:
+        # Typed against the representer mixin rather than a concrete dumper,
+        # so registration on both the pure-Python and C dumpers type-checks.
+        if data.value is _UNFILLED:
             raise ValueError(
                 "MutablePlaceholder has not been filled yet. Programmer error."
             )
@@ -0,0 +1,51 @@
+import copy
+
+import procgen_companion.core as pg
+from procgen_companion.util import MutablePlaceholder
+
+# !ProcIf inside !ProcRepeatChoice: the repeat deep-copies the unfilled
+# placeholder, and the copies must still register as unfilled so
+# finish_variation fills them (regression test for the _UNFILLED sentinel
+# not surviving deepcopy).
+TEMPLATE = """\
+!ArenaConfig
+arenas:
+  0: !Arena
+    pass_mark: 0
+    t: 250
+    items:
+      - !Item
+        name: Agent
+        id: agent
+        positions:
+          - !Vector3 { x: 20, y: 1, z: !ProcList [1, 10] }
+      - !Item
+        name: Wall
+        rotations: !ProcRepeatChoice
+          amount: 3
+          value: !ProcIf
+            value: agent.positions.0.z
+            cases: [1]
+            then: [0]
+            default: 180
+"""
+
+
+def test_unfilled_placeholder_survives_deepcopy():
+    placeholder = MutablePlaceholder(lambda root: (None, None))
+    assert not copy.deepcopy(placeholder).is_filled()
+
+
+def test_proc_if_inside_proc_repeat_choice(tmp_path):
+    path = tmp_path / "template.yaml"
+    path.write_text(TEMPLATE)
+    pg.init(1234)
+    template = pg.read(path)
+
+    variations = list(pg.generate("exhaustive", template, 2))
+
+    assert len(variations) == 2
+    for variation, _meta in variations:
+        rotations = variation["arenas"][0]["items"][1]["rotations"]
+        assert len(rotations) == 3
+        assert all(placeholder.is_filled() for placeholder in rotations)